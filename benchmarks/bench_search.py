@@ -0,0 +1,103 @@
+"""
+Search index benchmark
+
+Fills the given Redis with synthetic messages, part of them in one large channel and the rest spread over
+small channels, reports query latency percentiles per query kind and channel size, then deletes every key
+it wrote. Point it at a dedicated instance or database, never at a shared one.
+
+    python -m benchmarks.bench_search --redis-url redis://localhost:6379/15 --messages 10000000
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import uuid
+
+import aioredis
+
+from config.search import index_message, search_messages
+
+WORDS = [
+    '안녕하세요', '오늘', '저녁', '같이', '먹을래', '강남역', '카페', '맛집', '주말에', '영화',
+    '약속', '시간', '괜찮아', '사진', '보내줘', 'hello', 'lunch', 'meeting', 'coffee', 'tomorrow'
+]
+QUERIES = {
+    'term': ['맛집', '강남', 'coffee', '약속'],
+    'prefix': ['강*', '영화*', 'lun*', '오*'],
+    'phrase': ['"오늘 저녁"', '"강남역 카페"', '"hello lunch"']
+}
+
+
+def synthetic_message(created_at: int) -> dict:
+    return {
+        'message_id': str(uuid.uuid4()),
+        'view_type': 'PLAINTEXT',
+        'view': {'message': ' '.join(random.choices(WORDS, k=random.randint(2, 8)))},
+        'created_at': created_at,
+        'created_by': 'PICKME#bench'
+    }
+
+
+LARGE_CHANNEL = 'bench-large'
+
+
+async def fill(redis, channels: list[str], messages: int, large_share: float, concurrency: int):
+    created_at = int(time.time() * 1000) - messages
+    for start in range(0, messages, concurrency):
+        batch = []
+        for i in range(start, min(start + concurrency, messages)):
+            message = synthetic_message(created_at + i)
+            channel = LARGE_CHANNEL if random.random() < large_share else random.choice(channels)
+            batch.append(index_message(redis, channel, message, json.dumps(message, ensure_ascii=False)))
+        await asyncio.gather(*batch)
+
+
+async def measure(redis, channels: list[str], rounds: int, limit: int) -> dict:
+    latencies = {}
+    for _ in range(rounds):
+        for kind, queries in QUERIES.items():
+            for size, channel in (('small', random.choice(channels)), ('large', LARGE_CHANNEL)):
+                started = time.perf_counter()
+                await search_messages(redis, channel, random.choice(queries), None, limit)
+                latencies.setdefault(f'{kind}/{size}', []).append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+async def cleanup(redis):
+    keys = [key async for key in redis.scan_iter(match='search#bench-*', count=10000)]
+    for start in range(0, len(keys), 10000):
+        await redis.unlink(*keys[start:start + 10000])
+    print(f'deleted {len(keys)} benchmark keys')
+
+
+async def main(args):
+    redis = await aioredis.from_url(args.redis_url, encoding='utf-8', decode_responses=True)
+    channels = [f'bench-{i}' for i in range(args.channels)]
+
+    try:
+        started = time.perf_counter()
+        await fill(redis, channels, args.messages, args.large_share, args.concurrency)
+        print(f'indexed {args.messages} messages in {time.perf_counter() - started:.1f}s')
+
+        for name, samples in (await measure(redis, channels, args.rounds, args.limit)).items():
+            quantiles = statistics.quantiles(samples, n=100)
+            print(f'{name:<13} p50={quantiles[49]:.2f}ms p95={quantiles[94]:.2f}ms p99={quantiles[98]:.2f}ms')
+    finally:
+        if not args.keep:
+            await cleanup(redis)
+        await redis.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--redis-url', required=True, help='dedicated instance or database, e.g. redis://localhost:6379/15')
+    parser.add_argument('--messages', type=int, default=100_000)
+    parser.add_argument('--channels', type=int, default=1000)
+    parser.add_argument('--large-share', type=float, default=0.2, help='share of messages written to one large channel')
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=500)
+    parser.add_argument('--limit', type=int, default=30)
+    parser.add_argument('--keep', action='store_true', help='keep the benchmark keys instead of deleting them')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,47 @@
+"""
+Cold start benchmark
+
+Starts a fresh interpreter per round and reports how long importing an app module and running its
+startup hook take, i.e. the time before a new worker can accept traffic.
+
+    python -m benchmarks.bench_startup --app server.message.main --rounds 20
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+PROBE = '''
+import asyncio, json, time
+started = time.perf_counter()
+import importlib
+module = importlib.import_module({app!r})
+imported = time.perf_counter()
+asyncio.run(module.startup())
+ready = time.perf_counter()
+print(json.dumps({{"import": (imported - started) * 1000, "startup": (ready - imported) * 1000}}))
+'''
+
+
+def probe(app: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE.format(app=app)], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(args):
+    samples = [probe(args.app) for _ in range(args.rounds)]
+    for phase in ('import', 'startup'):
+        timings = [sample[phase] for sample in samples]
+        print(f'{phase:<7} median={statistics.median(timings):.1f}ms max={max(timings):.1f}ms')
+    totals = [sample['import'] + sample['startup'] for sample in samples]
+    print(f'{"total":<7} median={statistics.median(totals):.1f}ms max={max(totals):.1f}ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--app', default='server.message.main')
+    parser.add_argument('--rounds', type=int, default=20)
+    main(parser.parse_args())
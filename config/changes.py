@@ -0,0 +1,35 @@
+from functools import lru_cache
+
+from aioredis import Redis
+from aioredis.client import Script
+
+RECORD_CHANGE = """
+for i = 1, #KEYS, 2 do
+    local version = redis.call('INCR', KEYS[i])
+    redis.call('ZADD', KEYS[i + 1], version, ARGV[1])
+end
+"""
+
+
+@lru_cache()
+def record_change_script(redis: Redis) -> Script:
+    return redis.register_script(RECORD_CHANGE)
+
+
+async def record_change(redis: Redis, members: list[str], channel_id: str) -> None:
+    """Bump each member's change log version and mark the channel as changed at that version"""
+    keys = []
+    for member in members:
+        keys += [f'users#{member}#version', f'users#{member}#changes']
+    if keys:
+        await record_change_script(redis)(keys=keys, args=[channel_id])
+
+
+async def changes_since(redis: Redis, member: str, version: int) -> tuple[int, list[str], set[str]]:
+    """Current version, channels changed after `version` and the channels the member is joined to"""
+    pipe = redis.pipeline(transaction=True)
+    pipe.get(f'users#{member}#version')
+    pipe.zrangebyscore(f'users#{member}#changes', f'({version}', '+inf')
+    pipe.smembers(f'users#{member}#channels')
+    current, changed, joined = await pipe.execute()
+    return int(current or 0), changed, joined
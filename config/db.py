@@ -1,13 +1,12 @@
-from typing import Callable
+import asyncio
+from typing import Callable, Any
 
 import aioredis
 from boto3 import resource
 from aioredis import Redis
 from fastapi.concurrency import run_in_threadpool
 
-from config.settings import Settings
-
-settings = Settings()
+from config.settings import get_settings
 
 
 async def func_asyncio(func: Callable, **kwargs):
@@ -15,6 +14,7 @@ async def func_asyncio(func: Callable, **kwargs):
 
 
 async def get_redis_pool() -> Redis:
+    settings = get_settings()
     return await aioredis.from_url(
         f'redis://{settings.redis.redis_host}:{settings.redis.redis_port}',
         password=f'{settings.redis.redis_password}',
@@ -24,6 +24,7 @@ async def get_redis_pool() -> Redis:
 
 
 async def get_dynamo():
+    settings = get_settings()
     return await func_asyncio(
         func=resource,
         service_name='dynamodb',
@@ -34,4 +35,13 @@ async def get_dynamo():
 
 
 async def get_table(dynamo):
-    return await func_asyncio(dynamo.Table, name=settings.dynamo.table_name)
+    return await func_asyncio(dynamo.Table, name=get_settings().dynamo.table_name)
+
+
+async def connect() -> tuple[Redis, Any]:
+    """Create Redis and DynamoDB clients concurrently, optionally opening their connections up front"""
+    redis, dynamo = await asyncio.gather(get_redis_pool(), get_dynamo())
+    table = await get_table(dynamo)
+    if get_settings().server.prewarm_connections:
+        await asyncio.gather(redis.ping(), func_asyncio(table.load))
+    return redis, table
@@ -0,0 +1,8 @@
+import multiprocessing
+import os
+
+from config.settings import get_settings
+
+worker_class = 'uvicorn.workers.UvicornWorker'
+workers = int(os.getenv('WEB_CONCURRENCY') or multiprocessing.cpu_count())
+graceful_timeout = get_settings().server.graceful_timeout
@@ -91,6 +91,27 @@ class Message(BaseModel):
     date: int = Field(example=1665065862437)
 
 
+class EventType(str, Enum):
+    TYPING = "TYPING"
+    PRESENCE = "PRESENCE"
+    READ = "READ"
+
+
+class ControlType(str, Enum):
+    RECONNECT = "RECONNECT"
+
+
+class EphemeralEventRequest(BaseModel):
+    event: EventType
+
+
+class EphemeralEvent(BaseModel):
+    event: EventType
+    service: Service
+    user_id: str
+    created_at: int
+
+
 class MessageRequest(BaseModel):
     service: Service
     user_id: str
@@ -109,6 +130,11 @@ class MessageListResponse(BaseModel):
     messages: list[MessageResponse]
 
 
+class MessageSearchResponse(BaseModel):
+    messages: list[MessageResponse]
+    next_cursor: Union[str, None]
+
+
 class Member(BaseModel):
     service: Service
     user_id: str
@@ -144,6 +170,12 @@ class ChannelList(BaseModel):
     channels: list[ChannelListResponse]
 
 
+class ChannelSyncResponse(BaseModel):
+    version: int
+    channels: list[ChannelListResponse]
+    removed: list[str]
+
+
 class ChannelRequest(BaseModel):
     members: list[Member]
 
@@ -0,0 +1,173 @@
+import json
+import re
+from typing import Union
+
+from aioredis import Redis
+
+NGRAM_SIZE: int = 2
+SCAN_BATCH_SIZE: int = 200
+MAX_SCANNED_CANDIDATES: int = 2000
+QUERY_CACHE_TIME: int = 60
+
+WORD_PATTERN = re.compile(r'\w+')
+TERM_PATTERN = re.compile(r'"([^"]+)"|(\S+)')
+
+
+def normalize(text: str) -> str:
+    return ' '.join(WORD_PATTERN.findall(text.lower()))
+
+
+def ngrams(word: str) -> set[str]:
+    return {word[i:i + NGRAM_SIZE] for i in range(len(word) - NGRAM_SIZE + 1)}
+
+
+def tokenize(text: str) -> set[str]:
+    """Character n-grams of every word, plus a '^' marked head character for single character queries"""
+    tokens = set()
+    for word in WORD_PATTERN.findall(text.lower()):
+        tokens.add(f'^{word[0]}')
+        tokens.update(ngrams(word))
+    return tokens
+
+
+def parse_query(query: str) -> list[tuple[str, str]]:
+    """Split a query into (kind, text) terms, kind is one of 'phrase', 'prefix', 'term'"""
+    terms = []
+    for phrase, word in TERM_PATTERN.findall(query):
+        if phrase and normalize(phrase):
+            terms.append(('phrase', normalize(phrase)))
+        elif word.endswith('*') and normalize(word):
+            terms.append(('prefix', normalize(word)))
+        elif normalize(word):
+            terms.append(('term', normalize(word)))
+    return terms
+
+
+def query_tokens(kind: str, text: str) -> set[str]:
+    """Tokens every matching message must contain, a lone single character term matches word heads"""
+    words = text.split()
+    tokens = set()
+    for word in words:
+        if len(word) >= NGRAM_SIZE:
+            tokens.update(ngrams(word))
+        elif kind == 'prefix' or len(words) == 1:
+            tokens.add(f'^{word}')
+    return tokens
+
+
+def matches(terms: list[tuple[str, str]], text: str) -> bool:
+    document = normalize(text)
+    for kind, term in terms:
+        if kind == 'prefix' or (kind == 'term' and len(term) < NGRAM_SIZE):
+            if not re.search(rf'(^|\s){re.escape(term)}', document):
+                return False
+        elif term not in document:
+            return False
+    return True
+
+
+def searchable_text(message: dict) -> str:
+    view = message.get('view') or {}
+    if message.get('view_type') == 'PLAINTEXT':
+        return view.get('message', '')
+    elif message.get('view_type') == 'PLACE':
+        place_info = view.get('place_info', {})
+        return ' '.join(place_info.get(field, '') for field in ('name', 'parent_name', 'category'))
+    return ''
+
+
+async def index_message(redis: Redis, channel_id: str, message: dict, document: str) -> None:
+    """Add a message to the channel's inverted index, `document` is the serialized message returned by search"""
+    text = searchable_text(message)
+    if not text:
+        return
+
+    pipe = redis.pipeline(transaction=False)
+    pipe.hset(f'search#{channel_id}#messages', message['message_id'], document)
+    for token in tokenize(text):
+        pipe.zadd(f'search#{channel_id}#{token}', {message['message_id']: message['created_at']})
+    await pipe.execute()
+
+
+def parse_cursor(cursor: Union[str, None]) -> Union[tuple[int, str], None]:
+    """Cursor is '<created_at>:<message_id>' of the last scanned message, raises ValueError when malformed"""
+    if not cursor:
+        return None
+    created_at, message_id = cursor.split(':', 1)
+    return int(created_at), message_id
+
+
+async def candidates_key(redis: Redis, channel_id: str, tokens: set[str], refresh: bool) -> Union[str, None]:
+    """Sorted set of messages containing every token, intersections are kept QUERY_CACHE_TIME for next pages"""
+    keys = sorted(f'search#{channel_id}#{token}' for token in tokens)
+    if len(keys) == 1:
+        return keys[0] if await redis.exists(keys[0]) else None
+
+    key = f'search#{channel_id}#query#' + '#'.join(sorted(tokens))
+    if refresh or not await redis.exists(key):
+        pipe = redis.pipeline(transaction=True)
+        pipe.zinterstore(key, keys, aggregate='MAX')
+        pipe.expire(key, QUERY_CACHE_TIME)
+        count, _ = await pipe.execute()
+        if not count:
+            return None
+    return key
+
+
+async def next_candidates(redis: Redis, key: str, position: Union[tuple[int, str], None]) -> list[tuple[str, int]]:
+    """Next batch strictly after `position` in (created_at, message_id) descending order
+
+    Batches start from the position reached rather than a numeric offset, so messages indexed while
+    scanning cannot shift already read entries into the next batch.
+    """
+    skip = 0
+    while True:
+        batch = await redis.zrevrangebyscore(
+            key, position[0] if position else '+inf', '-inf', start=skip, num=SCAN_BATCH_SIZE, withscores=True
+        )
+        candidates = [
+            (message_id, int(created_at)) for message_id, created_at in batch
+            if not position or int(created_at) < position[0] or message_id < position[1]
+        ]
+        if candidates or len(batch) < SCAN_BATCH_SIZE:
+            return candidates
+        skip += len(batch)
+
+
+async def search_messages(
+        redis: Redis,
+        channel_id: str,
+        query: str,
+        cursor: Union[str, None],
+        limit: int
+) -> tuple[list[str], Union[str, None]]:
+    """Scan messages containing every query token newest first and verify them against the full query
+
+    At most MAX_SCANNED_CANDIDATES messages are read per call, the returned cursor is the position reached
+    so the next call continues from there even if fewer than `limit` matches were found.
+    """
+    after = parse_cursor(cursor)
+    terms = parse_query(query)
+    tokens = set().union(*(query_tokens(kind, text) for kind, text in terms)) if terms else set()
+    if not tokens or limit < 1:
+        return [], None
+
+    key = await candidates_key(redis, channel_id, tokens, refresh=after is None)
+    if key is None:
+        return [], None
+
+    found, scanned, position = [], 0, after
+    while scanned < MAX_SCANNED_CANDIDATES:
+        candidates = await next_candidates(redis, key, position)
+        if not candidates:
+            return found, None
+
+        documents = await redis.hmget(f'search#{channel_id}#messages', [message_id for message_id, _ in candidates])
+        for (message_id, created_at), document in zip(candidates, documents):
+            scanned += 1
+            position = (created_at, message_id)
+            if document and matches(terms, searchable_text(json.loads(document))):
+                found.append(document)
+            if len(found) == limit or scanned == MAX_SCANNED_CANDIDATES:
+                return found, f'{created_at}:{message_id}'
+    return found, None
@@ -1,4 +1,7 @@
-from pydantic import BaseSettings
+import math
+from functools import lru_cache
+
+from pydantic import BaseSettings, Field
 
 env = ".env"
 
@@ -19,7 +22,23 @@ class DynamoSettings(BaseSettings):
     table_name: str
 
 
+class ServerSettings(BaseSettings):
+    prewarm_connections: bool = False
+    drain_window: float = 10
+    drain_batches: int = 10
+
+    @property
+    def graceful_timeout(self) -> int:
+        return math.ceil(self.drain_window) + 5
+
+
 class Settings(BaseSettings):
-    redis: RedisSettings = RedisSettings(_env_file=env)
-    boto3: BotoSettings = BotoSettings(_env_file=env)
-    dynamo: DynamoSettings = DynamoSettings(_env_file=env)
+    redis: RedisSettings = Field(default_factory=lambda: RedisSettings(_env_file=env))
+    boto3: BotoSettings = Field(default_factory=lambda: BotoSettings(_env_file=env))
+    dynamo: DynamoSettings = Field(default_factory=lambda: DynamoSettings(_env_file=env))
+    server: ServerSettings = Field(default_factory=lambda: ServerSettings(_env_file=env))
+
+
+@lru_cache()
+def get_settings() -> Settings:
+    return Settings()
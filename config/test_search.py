@@ -0,0 +1,32 @@
+import pytest
+
+from .search import tokenize, parse_query, query_tokens, matches, parse_cursor
+
+
+def test_tokenize_korean_bigrams():
+    assert tokenize('강남역 맛집') == {'^강', '강남', '남역', '^맛', '맛집'}
+
+
+def test_parse_query():
+    assert parse_query('"오늘 저녁" 강* 맛집') == [('phrase', '오늘 저녁'), ('prefix', '강'), ('term', '맛집')]
+
+
+def test_query_tokens_are_indexed():
+    text = '오늘 저녁 강남역 맛집 어때'
+    for kind, term in parse_query('"오늘 저녁" 강* 남역 어'):
+        assert query_tokens(kind, term) <= tokenize(text)
+
+
+def test_matches():
+    text = '오늘 저녁 강남역 맛집 어때'
+    assert matches(parse_query('"저녁 강남"'), text)
+    assert matches(parse_query('남역 맛*'), text)
+    assert not matches(parse_query('"강남역 저녁"'), text)
+    assert not matches(parse_query('남역*'), text)
+
+
+def test_parse_cursor():
+    assert parse_cursor(None) is None
+    assert parse_cursor('1665065862437:6f1c') == (1665065862437, '6f1c')
+    with pytest.raises(ValueError):
+        parse_cursor('6f1c')
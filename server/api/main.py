@@ -4,13 +4,14 @@ import uuid
 from typing import Any
 
 from boto3.dynamodb import conditions
-from fastapi import FastAPI, status, Request
+from fastapi import FastAPI, status, Request, Query
 from fastapi.responses import JSONResponse
 from pydantic.json import pydantic_encoder
 
 from config.db import *
 from config.models import *
-from config.settings import Settings
+from config.changes import record_change, changes_since
+from config.search import search_messages, parse_cursor
 from config.logging import logger, log_request
 
 app = FastAPI(
@@ -22,19 +23,18 @@ app = FastAPI(
         "email": "nerolizm@gmail.com"
     }
 )
-settings = Settings()
 redis: Union[Redis, None] = None
 table: Any = None
 
 THOUSAND_TIMES: int = 1000
 MAX_MESSAGE_COUNT: int = 300
+SEARCH_PAGE_SIZE: int = 30
 
 
 @app.on_event('startup')
 async def startup():
     global redis, table
-    redis = await get_redis_pool()
-    table = await get_table(await get_dynamo())
+    redis, table = await connect()
 
 
 @app.on_event('shutdown')
@@ -90,6 +90,30 @@ async def marked_as_read(service: Service, user_id: str, channel_id: str, read_t
         key=f'{service}#{user_id}#read',
         value=read_time or int(time.time() * THOUSAND_TIMES)
     )
+    await record_change(redis, [f'{service}#{user_id}'], channel_id)
+
+
+async def get_channel(service: Service, user_id: str, channel_id: str) -> ChannelListResponse:
+    async def get_members(users: dict) -> tuple:
+        member_list = []
+        joined_count = 0
+        for user, state in users.items():
+            member_list.append(MemberWithState(**await redis.hgetall(f'users#{user}'), state=state))
+            if state == 'joined':
+                joined_count += 1
+        return member_list, len(users), joined_count
+
+    [members, member_count, joined_member_count] = await get_members(
+        await redis.hgetall(f'channels#{channel_id}#members')
+    )
+    return ChannelListResponse(
+        **await redis.hgetall(f'channels#{channel_id}'),
+        member_count=member_count,
+        joined_member_count=joined_member_count,
+        members=members,
+        unread_message_count=await get_unread_message_count(service, user_id, channel_id),
+        last_message=await get_last_message(channel_id)
+    )
 
 
 @app.get("/", status_code=200, include_in_schema=False)
@@ -97,6 +121,17 @@ async def health_check():
     return
 
 
+@app.get("/ready", status_code=200, include_in_schema=False)
+async def readiness_check():
+    try:
+        if redis is None or table is None or not await redis.ping():
+            return JSONResponse({'message': 'Not ready'}, status.HTTP_503_SERVICE_UNAVAILABLE)
+    except Exception as exc:
+        logger.info(f'{readiness_check.__name__} : {exc}')
+        return JSONResponse({'message': 'Not ready'}, status.HTTP_503_SERVICE_UNAVAILABLE)
+    return
+
+
 @app.put("/users/{service}/{user_id}", response_model=User, tags=["User"])
 @log_request
 async def upsert_user(service: Service, user_id: str, request: UserRequest):
@@ -160,34 +195,28 @@ async def delete_tokens(service: Service, user_id: str, token_type: TokenType):
 @log_request
 async def list_channels(service: Service, user_id: str):
     """List channels"""
-    async def get_members(users: dict) -> tuple:
-        member_list = []
-        joined_count = 0
-        for user, state in users.items():
-            member_list.append(MemberWithState(**await redis.hgetall(f'users#{user}'), state=state))
-            if state == 'joined':
-                joined_count += 1
-        return member_list, len(users), joined_count
-
-    channels = []
     channel_list = await redis.smembers(f'users#{service}#{user_id}#channels')
 
-    for channel_id in channel_list:
-        [members, member_count, joined_member_count] = await get_members(
-            await redis.hgetall(f'channels#{channel_id}#members')
-        )
-        channels.append(ChannelListResponse(
-            **await redis.hgetall(f'channels#{channel_id}'),
-            member_count=member_count,
-            joined_member_count=joined_member_count,
-            members=members,
-            unread_message_count=await get_unread_message_count(service, user_id, channel_id),
-            last_message=await get_last_message(channel_id)
-        ))
+    channels = [await get_channel(service, user_id, channel_id) for channel_id in channel_list]
 
     return ChannelList(channels=channels)
 
 
+@app.get("/channels/{service}/{user_id}/sync", response_model=ChannelSyncResponse, tags=["Channel"])
+@log_request
+async def sync_channels(service: Service, user_id: str, version: int = 0):
+    """List channels changed since the version of the previous sync, version 0 returns every channel"""
+    current, changed, joined = await changes_since(redis, f'{service}#{user_id}', version)
+    if not version:
+        changed = joined
+
+    return ChannelSyncResponse(
+        version=current,
+        channels=[await get_channel(service, user_id, channel_id) for channel_id in changed if channel_id in joined],
+        removed=[channel_id for channel_id in changed if channel_id not in joined]
+    )
+
+
 @app.post("/channels", response_model=ChannelResponse, tags=["Channel"])
 @log_request
 async def create_channel(request: ChannelRequest):
@@ -214,6 +243,7 @@ async def create_channel(request: ChannelRequest):
         created_at=timestamp
     )
     await redis.hset(f'channels#{channel_id}', mapping=channel.dict())
+    await record_change(redis, [f'{member.service}#{member.user_id}' for member in request.members], channel_id)
 
     return ChannelResponse(channel=channel_id, type=channel_type)
 
@@ -230,6 +260,12 @@ async def leave_channel(channel_id: str, request: Member):
 
     await redis.hset(f'channels#{channel_id}#members', f'{request.service}#{request.user_id}', 'left')
     await redis.srem(f'users#{request.service}#{request.user_id}#channels', channel_id)
+    members = await redis.hgetall(f'channels#{channel_id}#members')
+    await record_change(
+        redis,
+        [member for member, state in members.items() if state == 'joined'] + [f'{request.service}#{request.user_id}'],
+        channel_id
+    )
 
     return JSONResponse({'message': 'Channel left successfully'}, status.HTTP_200_OK)
 
@@ -257,6 +293,27 @@ async def list_messages(service: Service, user_id: str, channel_id: str):
     )
 
 
+@app.get("/messages/{service}/{user_id}/{channel_id}/search", response_model=MessageSearchResponse, tags=["Message"])
+@log_request
+async def search_message(service: Service, user_id: str, channel_id: str, q: str, cursor: str = None,
+                         limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=MAX_MESSAGE_COUNT)):
+    """Search messages, use "quoted phrase" for phrase and prefix* for prefix queries"""
+    if not await channel_joined(service, user_id, channel_id):
+        return JSONResponse({'message': f"[{service}] '{user_id}' is not joined this channel"}, status.HTTP_400_BAD_REQUEST)
+
+    try:
+        parse_cursor(cursor)
+    except ValueError:
+        return JSONResponse({'message': f"'{cursor}' is not a valid cursor"}, status.HTTP_400_BAD_REQUEST)
+
+    documents, next_cursor = await search_messages(redis, channel_id, q, cursor, limit)
+
+    return MessageSearchResponse(
+        messages=[MessageResponse.parse_raw(document) for document in documents],
+        next_cursor=next_cursor
+    )
+
+
 @app.put("/messages/{channel_id}/read", tags=["Message"])
 @log_request
 async def read_message(channel_id: str, request: MessageRequest):
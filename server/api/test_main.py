@@ -18,6 +18,11 @@ def test_main(client):
     assert response.status_code == 200
 
 
+def test_ready(client):
+    response = client.get("/ready")
+    assert response.status_code == 200
+
+
 def test_upsert_user(client):
     response = client.put(f"/users/{service}/{user_id}", json={
         "nickname": "테스트유저",
@@ -44,6 +49,20 @@ def test_register_token(client):
     assert response.status_code == 200
 
 
+def test_sync_channels(client):
+    response = client.get(f"/channels/{service}/{user_id}/sync")
+    assert response.status_code == 200
+    version = response.json()['version']
+
+    channel = client.post("/channels", json={"members": [{"service": service, "user_id": user_id}]}).json()['channel']
+    response = client.get(f"/channels/{service}/{user_id}/sync", params={"version": version})
+    assert [c['channel'] for c in response.json()['channels']] == [channel]
+
+    client.put(f"/channels/{channel}/leave", json={"service": service, "user_id": user_id})
+    response = client.get(f"/channels/{service}/{user_id}/sync", params={"version": response.json()['version']})
+    assert response.json()['removed'] == [channel]
+
+
 def test_delete_user(client):
     response = client.delete(f"/users/{service}/{user_id}")
     assert response.status_code == 200
@@ -1,15 +1,22 @@
 import asyncio
+import json
+import os
+import signal
+import threading
 import time
 import uuid
 from typing import Any
 
 from aioredis.client import PubSub
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, status
+from fastapi.responses import JSONResponse
 from starlette.websockets import WebSocketDisconnect
 
 from config.db import *
 from config.models import *
-from config.settings import Settings
+from config.changes import record_change
+from config.search import index_message
+from config.settings import get_settings
 from config.logging import logger, log_request
 
 app = FastAPI(
@@ -21,18 +28,24 @@ app = FastAPI(
         "email": "nerolizm@gmail.com"
     }
 )
-settings = Settings()
 redis: Union[Redis, None] = None
 table: Any = None
+connections: dict[ChatRequest, asyncio.Event] = {}
+draining: bool = False
+terminating: Union[asyncio.Task, None] = None
 
 THOUSAND_TIMES: int = 1000
+EPHEMERAL_COALESCE_TIME: int = 1000
+EPHEMERAL_CHANNEL_LIMIT: int = 20
+PUBSUB_FLUSH_TIME: float = 0.5
 
 
 @app.on_event('startup')
 async def startup():
     global redis, table
-    redis = await get_redis_pool()
-    table = await get_table(await get_dynamo())
+    redis, table = await connect()
+    if threading.current_thread() is threading.main_thread():
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, handle_sigterm)
 
 
 @app.on_event('shutdown')
@@ -40,6 +53,17 @@ async def shutdown():
     await redis.close()
 
 
+@app.get("/ready", status_code=200, include_in_schema=False)
+async def readiness_check():
+    try:
+        if draining or redis is None or table is None or not await redis.ping():
+            return JSONResponse({'message': 'Not ready'}, status.HTTP_503_SERVICE_UNAVAILABLE)
+    except Exception as exc:
+        logger.info(f'{readiness_check.__name__} : {exc}')
+        return JSONResponse({'message': 'Not ready'}, status.HTTP_503_SERVICE_UNAVAILABLE)
+    return
+
+
 @app.get("/chat", tags=["chat"], include_in_schema=False)
 async def get():
     from starlette.responses import HTMLResponse
@@ -49,26 +73,48 @@ async def get():
 
 @app.websocket("/channels/{channel}/{service}/{user_id}")
 async def websocket_endpoint(request: ChatRequest = Depends()):
+    if draining:
+        await request.ws.close(code=status.WS_1012_SERVICE_RESTART)
+        return
     await request.ws.accept()
-    await connection(request)
+    connections[request] = asyncio.Event()
+    try:
+        await connection(request)
+    finally:
+        connections.pop(request, None)
 
 
 async def connection(request: ChatRequest):
+    busy = False
+    last_received = time.monotonic()
+
     async def client_handler(ws: WebSocket):
+        nonlocal busy, last_received
+        last_sent: dict = {}
         try:
             while True:
                 message = await ws.receive_json()
-                if message:
+                busy, last_received = True, time.monotonic()
+                if message and 'event' in message:
+                    await ephemeral(request, message=message, last_sent=last_sent)
+                elif message:
                     await broadcast(request.channel, message=message)
+                busy = False
         except WebSocketDisconnect:
             await marked_as_read(request.member.service, request.member.user_id, request.channel)
 
     async def pubsub_handler(ws: WebSocket):
+        closing = connections[request]
         try:
             while True:
-                message = await pubsub.get_message(ignore_subscribe_messages=True)
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=PUBSUB_FLUSH_TIME if closing.is_set() else 0.0
+                )
                 if message:
                     await ws.send_text(message.get('data'))
+                elif closing.is_set() and not busy and time.monotonic() - last_received >= PUBSUB_FLUSH_TIME:
+                    break
+            await ws.close(code=status.WS_1012_SERVICE_RESTART)
         except Exception as exc:
             logger.info(f'{pubsub_handler.__name__} : {exc}')
 
@@ -89,12 +135,56 @@ async def connection(request: ChatRequest):
         task.cancel()
 
 
+async def drain():
+    """Ask clients to reconnect elsewhere, then close sockets in staggered batches over the drain window"""
+    global draining
+    if draining:
+        return
+    draining = True
+
+    requests = list(connections)
+    frame = json.dumps({'control': ControlType.RECONNECT.value})
+    for request in requests:
+        try:
+            await request.ws.send_text(frame)
+        except Exception as exc:
+            logger.info(f'{drain.__name__} : {exc}')
+
+    settings = get_settings()
+    batches = max(settings.server.drain_batches, 1)
+    batch_size = -(-len(requests) // batches) or 1
+    interval = settings.server.drain_window / batches
+    for i in range(0, len(requests), batch_size):
+        for request in requests[i:i + batch_size]:
+            if request in connections:
+                connections[request].set()
+        await asyncio.sleep(interval)
+
+    deadline = time.monotonic() + max(interval, PUBSUB_FLUSH_TIME * 2)
+    while connections and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+    logger.info(f'{drain.__name__} : drained {len(requests) - len(connections)}/{len(requests)} connections')
+
+
+async def terminate():
+    await drain()
+    os.kill(os.getpid(), signal.SIGINT)
+
+
+def handle_sigterm():
+    """Start terminating on the first SIGTERM, later ones must not cut the running drain short"""
+    global terminating
+    if terminating is None:
+        terminating = asyncio.create_task(terminate())
+
+
 async def marked_as_read(service: Service, user_id: str, channel_id: str, read_time: int = None) -> None:
     await redis.hset(
         name=f'channels#{channel_id}#status',
         key=f'{service}#{user_id}#read',
         value=read_time or int(time.time() * THOUSAND_TIMES)
     )
+    await record_change(redis, [f'{service}#{user_id}'], channel_id)
 
 
 @log_request
@@ -118,9 +208,49 @@ async def broadcast(channel: str, message: dict):
         created_by=User(**await redis.hgetall(f"users#{message['service']}#{message['from']}"))
     )
 
+    document = message_response.json(ensure_ascii=False)
     await func_asyncio(table.put_item, Item={'channel_id': channel, **message_response.dict()})
-    await redis.publish(channel, message_response.json(ensure_ascii=False))
-    await push(await redis.hkeys(f'channels#{channel}#members'))
+    await redis.publish(channel, document)
+    try:
+        await index_message(redis, channel, message_response.dict(), document)
+    except Exception as exc:
+        logger.info(f'{index_message.__name__} : {exc}')
+
+    members = await redis.hgetall(f'channels#{channel}#members')
+    await record_change(redis, [member for member, state in members.items() if state == 'joined'], channel)
+    await push(list(members))
+
+
+async def channel_throttled(channel: str) -> bool:
+    key = f'channels#{channel}#ephemeral'
+    pipe = redis.pipeline(transaction=True)
+    pipe.set(key, 0, px=THOUSAND_TIMES, nx=True)
+    pipe.incr(key)
+    _, count = await pipe.execute()
+    return count > EPHEMERAL_CHANNEL_LIMIT
+
+
+async def ephemeral(request: ChatRequest, message: dict, last_sent: dict):
+    """Fan out typing/presence/read events through pub/sub only, never persisted or pushed"""
+    try:
+        event = EventType(message['event'])
+    except ValueError:
+        return
+
+    timestamp = int(time.time() * THOUSAND_TIMES)
+    if timestamp - last_sent.get(event, 0) < EPHEMERAL_COALESCE_TIME:
+        return
+    last_sent[event] = timestamp
+
+    if await channel_throttled(request.channel):
+        return
+
+    await redis.publish(request.channel, EphemeralEvent(
+        event=event,
+        service=request.member.service,
+        user_id=request.member.user_id,
+        created_at=timestamp
+    ).json(ensure_ascii=False))
 
 
 @app.post("/channels/{channel}/{service}/{user_id}", tags=["Websocket"])
@@ -133,3 +263,9 @@ async def fake_websocket(channel: str, service: Service, user_id: str):
 async def fake_websocket_message(message: Message):
     """Format the message you send after connecting to the websocket"""
     pass
+
+
+@app.post("/channels/_event", response_model=EphemeralEvent, tags=["Websocket"])
+async def fake_websocket_event(event: EphemeralEventRequest):
+    """Format the ephemeral event (typing, presence, read) you send after connecting to the websocket"""
+    pass
@@ -0,0 +1,128 @@
+import pytest
+
+from . import main
+from server.api.main import app as api_app
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+service: str = "PICKME"
+user_id: str = "test"
+message_count: int = 50
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    monkeypatch.setattr(main.get_settings().server, 'drain_window', 1)
+    monkeypatch.setattr(main, 'draining', False)
+    with TestClient(api_app) as api, TestClient(main.app) as message:
+        yield api, message
+
+
+def create_channel(api) -> str:
+    api.put(f"/users/{service}/{user_id}", json={"nickname": "테스트유저", "source": {}, "meta": {}})
+    return api.post("/channels", json={"members": [{"service": service, "user_id": user_id}]}).json()['channel']
+
+
+def plain_text(text: str, date: int = 1665065862437) -> dict:
+    return {
+        "service": service,
+        "from": user_id,
+        "view_type": "PLAINTEXT",
+        "view": {"message": text},
+        "date": date
+    }
+
+
+def receive_until_message(ws) -> list:
+    frames = []
+    while not frames or 'message_id' not in frames[-1]:
+        frames.append(ws.receive_json())
+    return frames
+
+
+def test_ephemeral_event_not_persisted(clients):
+    api, message = clients
+    channel = create_channel(api)
+
+    with message.websocket_connect(f"/channels/{channel}/{service}/{user_id}") as ws:
+        ws.send_json({"event": "TYPING"})
+        frame = ws.receive_json()
+
+    assert frame['event'] == "TYPING"
+    assert frame['user_id'] == user_id
+    assert api.get(f"/messages/{service}/{user_id}/{channel}").json()['messages'] == []
+
+
+def test_ephemeral_invalid_event_dropped(clients):
+    api, message = clients
+    channel = create_channel(api)
+
+    with message.websocket_connect(f"/channels/{channel}/{service}/{user_id}") as ws:
+        ws.send_json({"event": "SHOUT"})
+        ws.send_json({"event": "PRESENCE"})
+        frame = ws.receive_json()
+
+    assert frame['event'] == "PRESENCE"
+
+
+def test_ephemeral_coalesced_per_sender(clients):
+    api, message = clients
+    channel = create_channel(api)
+
+    with message.websocket_connect(f"/channels/{channel}/{service}/{user_id}") as ws:
+        ws.send_json({"event": "TYPING"})
+        ws.send_json({"event": "TYPING"})
+        ws.send_json({"event": "TYPING"})
+        ws.send_json(plain_text("sentinel"))
+        frames = receive_until_message(ws)
+
+    assert [frame.get('event') for frame in frames[:-1]] == ["TYPING"]
+
+
+def test_ephemeral_channel_limit(clients, monkeypatch):
+    monkeypatch.setattr(main, 'EPHEMERAL_COALESCE_TIME', 0)
+    monkeypatch.setattr(main, 'EPHEMERAL_CHANNEL_LIMIT', 3)
+    api, message = clients
+    channel = create_channel(api)
+
+    with message.websocket_connect(f"/channels/{channel}/{service}/{user_id}") as ws:
+        for _ in range(main.EPHEMERAL_CHANNEL_LIMIT + 2):
+            ws.send_json({"event": "TYPING"})
+        ws.send_json(plain_text("sentinel"))
+        frames = receive_until_message(ws)
+
+    assert len(frames[:-1]) == main.EPHEMERAL_CHANNEL_LIMIT
+    assert [m['view']['message'] for m in api.get(f"/messages/{service}/{user_id}/{channel}").json()['messages']] == ["sentinel"]
+
+
+def test_rolling_restart_message_loss(clients, monkeypatch):
+    api, message = clients
+    channel = create_channel(api)
+    sent = {f"rolling restart {i}" for i in range(message_count)}
+
+    frames = []
+    with message.websocket_connect(f"/channels/{channel}/{service}/{user_id}") as ws:
+        for i in range(message_count):
+            ws.send_json(plain_text(f"rolling restart {i}", 1665065862437 + i))
+        message.portal.call(main.drain)
+        try:
+            while True:
+                frames.append(ws.receive_json())
+        except WebSocketDisconnect:
+            pass
+
+    assert {"control": "RECONNECT"} in frames
+    assert message.get("/ready").status_code == 503
+
+    # the replacement worker accepts the reconnect
+    monkeypatch.setattr(main, 'draining', False)
+    with message.websocket_connect(f"/channels/{channel}/{service}/{user_id}") as ws:
+        ws.send_json(plain_text("after restart", 1665065862437 + message_count))
+        while not any(frame.get('view', {}).get('message') == "after restart" for frame in frames):
+            frames.append(ws.receive_json())
+
+    delivered = {frame['view']['message'] for frame in frames if 'message_id' in frame}
+    persisted = {m['view']['message'] for m in api.get(f"/messages/{service}/{user_id}/{channel}").json()['messages']}
+
+    assert sent <= delivered, f"lost before delivery: {sorted(sent - delivered)}"
+    assert sent <= persisted, f"lost before persistence: {sorted(sent - persisted)}"